@@ -0,0 +1,554 @@
+import abc
+import asyncio
+import logging
+import hashlib
+import functools
+import requests
+from requests.adapters import HTTPAdapter
+import random
+import re
+import tenacity
+import threading
+from collections import OrderedDict, deque
+import groq
+from groq import Groq, AsyncGroq
+
+
+# retry transient Groq failures (429/5xx/connection) before falling back to default text;
+# the SDK clients are built with max_retries=0 so this is the only retry layer
+_retry_transient = tenacity.retry(
+    retry=tenacity.retry_if_exception_type((groq.RateLimitError, groq.APIConnectionError, groq.InternalServerError)),
+    wait=tenacity.wait_exponential_jitter(initial=0.2, max=4),
+    stop=tenacity.stop_after_attempt(3),
+    reraise=True,
+)
+
+
+# words that map straight to a topic without asking the LLM
+TOPIC_KEYWORDS = {
+    "debug": "coding", "debugging": "coding", "bug": "coding", "bugs": "coding",
+    "code": "coding", "coding": "coding", "semicolon": "coding", "compiler": "coding",
+    "gym": "gym", "workout": "gym", "gains": "gym", "lifting": "gym",
+    "exam": "exams", "exams": "exams", "finals": "exams", "midterm": "exams", "midterms": "exams",
+    "sleep": "sleep", "sleeping": "sleep", "all-nighter": "sleep", "insomnia": "sleep",
+    "ai": "ai", "chatgpt": "ai", "llm": "ai",
+}
+
+
+def _keyword_topic(chat_context: str):
+    """
+    Returns the topic of the first TOPIC_KEYWORDS word found in the chat, or None.
+    """
+    for word in re.findall(r"[a-z0-9'-]+", chat_context.lower()):
+        if word in TOPIC_KEYWORDS:
+            return TOPIC_KEYWORDS[word]
+    return None
+
+
+# 'TOPIC: x' / 'CAPTION: y' labels in a fused completion; a topic stops at a CAPTION label on the same line
+_TOPIC_LABEL = re.compile(r"TOPIC:\s*(.*?)\s*(?=CAPTION:|$)", re.IGNORECASE | re.MULTILINE)
+_CAPTION_LABEL = re.compile(r"CAPTION:\s*(.*?)\s*$", re.IGNORECASE | re.MULTILINE)
+
+
+def _reservoir_sample(items):
+    """
+    Picks one element uniformly at random from an iterable in a single pass, without building a list.
+    """
+    selected = None
+    for i, item in enumerate(items, start=1):
+        if random.random() < 1 / i:
+            selected = item
+    return selected
+
+
+@functools.lru_cache(maxsize=None)
+def _groq_client(api_key: str) -> Groq:
+    """
+    One sync Groq client per API key, shared by every generator in the process.
+    AsyncGroq is not shared: its connections are bound to the event loop that opened them.
+    """
+    return Groq(api_key=api_key, max_retries=0)
+
+
+@functools.lru_cache(maxsize=None)
+def _shared_session() -> requests.Session:
+    """
+    Keep-alive session shared by all HTTP calls in the process.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+if not logging.getLogger().handlers:
+    logging.basicConfig(level=logging.INFO)
+
+
+class MemeGeneratorBase(abc.ABC):
+    """
+    Shared LLaMA 3-70B (via Groq) topic and caption logic for the meme generators.
+    Subclasses plug in a meme source by implementing fetch_meme() and render().
+    """
+
+    BATCH_SIZE = 10  # chats packed into one generate_memes_batch prompt
+    TOPIC_CACHE_SIZE = 1024  # chat contexts (and topic caption pools) kept in the LRU caches
+    CAPTION_POOL_SIZE = 5  # captions generated per Groq call and rotated per topic
+
+    DEFAULT_TOPIC = "funny"
+    DEFAULT_CAPTION = "When life gives you errors, debug them!"
+
+    # static system prompts; variable content always goes in the user message so Groq's
+    # prompt-prefix cache can hit
+    _TOPIC_SYSTEM = {
+        "role": "system",
+        "content": "Analyze the given conversation and return only a single-word topic "
+                   "(e.g., 'coding', 'gym', 'AI', 'exams', 'sleep', etc.) that best represents the discussion."
+    }
+    _CAPTION_SYSTEM = {
+        "role": "system",
+        "content": f"You are a meme expert. Generate ONLY {CAPTION_POOL_SIZE} different short, funny meme captions "
+                   f"for the topic the user provides, one per line, each under 10 words. "
+                   f"DO NOT add any explanations, introductions, numbering, or extra text. Just output the captions."
+    }
+    _TOPIC_AND_CAPTION_SYSTEM = {
+        "role": "system",
+        "content": "Return two lines: first line a single-word topic; second line a <=10-word meme caption "
+                   "for that topic. Format them as 'TOPIC: <topic>' and 'CAPTION: <caption>'. "
+                   "DO NOT add any explanations, introductions, or extra text."
+    }
+    _BATCH_SYSTEM = {
+        "role": "system",
+        "content": "For each numbered conversation below, output one line `N) TOPIC | CAPTION`, where TOPIC is "
+                   "a single word and CAPTION is a short, funny meme caption under 10 words. "
+                   "Output nothing else."
+    }
+
+    def __init__(self, api_key: str):
+        """
+        Initialize the shared Groq client, HTTP session and caches.
+        """
+        self.client = _groq_client(api_key)
+        self._api_key = api_key  # for the per-call AsyncGroq clients
+        self.http = _shared_session()
+        self.logger = logging.getLogger(type(self).__module__)
+        self._topic_cache = OrderedDict()  # sha1(chat) -> topic, LRU order
+        self._caption_cache = OrderedDict()  # topic -> deque of unused captions, LRU order
+        self._cache_lock = threading.Lock()  # guards both caches; callers run in to_thread workers
+
+    @abc.abstractmethod
+    def fetch_meme(self) -> tuple:
+        """
+        Picks a meme from the source. Returns (meme_id_or_url, display_name), or (None, None) on failure.
+        """
+
+    @abc.abstractmethod
+    def render(self, meme, text: str, **kwargs):
+        """
+        Puts the caption on the meme picked by fetch_meme. Returns the result URL/path, or None on failure.
+        """
+
+    async def afetch_meme(self) -> tuple:
+        """
+        Async fetch_meme; runs the blocking call in a thread unless a subclass does better.
+        """
+        return await asyncio.to_thread(self.fetch_meme)
+
+    async def arender(self, meme, text: str, **kwargs):
+        """
+        Async render; runs the blocking call in a thread unless a subclass does better.
+        """
+        return await asyncio.to_thread(self.render, meme, text, **kwargs)
+
+    def extract_topic_from_chat(self, chat_context: str) -> str:
+        """
+        Uses LLaMA 3-70B to analyze chat and determine the meme topic.
+        Obvious topics are matched locally against TOPIC_KEYWORDS; LLM results are cached
+        per (normalized) chat context.
+        """
+        topic = _keyword_topic(chat_context) or self._get_cached_topic(chat_context)
+        if topic:
+            return topic
+
+        messages = [
+            self._TOPIC_SYSTEM,
+            {
+                "role": "user",
+                "content": chat_context
+            }
+        ]
+
+        try:
+            completion = self._create_completion(
+                model="llama3-70b-8192",
+                messages=messages,
+                temperature=0.7,
+                max_completion_tokens=5,
+                top_p=1,
+                stream=False,
+                stop=None,
+            )
+
+            topic = completion.choices[0].message.content or ""
+
+            topic = topic.strip().lower()
+            if not topic:
+                return self.DEFAULT_TOPIC  # not cached, so the next call asks again
+            self._cache_topic(chat_context, topic)
+            return topic
+
+        except Exception as e:
+            self.logger.error(f"Error extracting topic: {str(e)}")
+            return self.DEFAULT_TOPIC
+
+    def generate_meme_caption(self, topic: str, meme_name: str = None) -> str:
+        """
+        Uses LLaMA 3-70B to generate a short meme caption for the topic.
+        Captions are generated CAPTION_POOL_SIZE at a time and handed out one per call, so repeated
+        topics only hit Groq once per pool. meme_name is accepted for back-compat and unused.
+        """
+        with self._cache_lock:
+            pool = self._caption_cache.get(topic)
+            if pool is not None:
+                try:
+                    meme_caption = pool.popleft()
+                except IndexError:
+                    pass  # pool drained, fetch a fresh batch
+                else:
+                    self._caption_cache.move_to_end(topic)
+                    return meme_caption
+
+        messages = [
+            self._CAPTION_SYSTEM,
+            {
+                "role": "user",
+                "content": topic
+            }
+        ]
+
+        try:
+            completion = self._create_completion(
+                model="llama3-70b-8192",
+                messages=messages,
+                temperature=1.0,
+                max_completion_tokens=20 * self.CAPTION_POOL_SIZE,
+                top_p=1,
+                stream=False,
+                stop=None,
+            )
+
+            response = completion.choices[0].message.content or ""
+
+        except Exception as e:
+            self.logger.error(f"Error generating meme caption: {str(e)}")
+            return self.DEFAULT_CAPTION
+
+        captions = [line.strip().replace('"', '') for line in response.split("\n") if line.strip()]
+        if not captions:
+            return self.DEFAULT_CAPTION
+
+        self._cache_captions(topic, captions[1:self.CAPTION_POOL_SIZE])
+        return captions[0]
+
+    def generate_topic_and_caption(self, chat_context: str) -> tuple:
+        """
+        Uses a single LLaMA 3-70B call to determine the meme topic and write its caption.
+        Saves a full round-trip compared to extract_topic_from_chat + generate_meme_caption.
+        """
+        topic = _keyword_topic(chat_context) or self._get_cached_topic(chat_context)
+        if topic:
+            return topic, self.generate_meme_caption(topic)
+
+        try:
+            completion = self._create_completion(
+                model="llama3-70b-8192",
+                messages=self._topic_and_caption_messages(chat_context),
+                temperature=0.9,
+                max_completion_tokens=30,
+                top_p=1,
+                stream=False,
+                stop=None,
+            )
+
+            response = completion.choices[0].message.content or ""
+
+        except Exception as e:
+            self.logger.error(f"Error generating topic and caption: {str(e)}")
+            return self.DEFAULT_TOPIC, self.DEFAULT_CAPTION
+
+        topic, meme_caption = self._parse_topic_and_caption(response)
+        if topic:
+            self._cache_topic(chat_context, topic)
+        else:
+            topic = self.DEFAULT_TOPIC  # not cached, so the next call asks again
+        if meme_caption is None:
+            meme_caption = self.generate_meme_caption(topic)
+        return topic, meme_caption
+
+    async def _atopic_and_caption(self, async_client: AsyncGroq, chat_context: str) -> tuple:
+        """
+        Async version of generate_topic_and_caption using the given AsyncGroq client.
+        """
+        topic = _keyword_topic(chat_context) or self._get_cached_topic(chat_context)
+        if topic:
+            return topic, await asyncio.to_thread(self.generate_meme_caption, topic)
+
+        try:
+            completion = await self._acreate_completion(
+                async_client,
+                model="llama3-70b-8192",
+                messages=self._topic_and_caption_messages(chat_context),
+                temperature=0.9,
+                max_completion_tokens=30,
+                top_p=1,
+                stream=False,
+                stop=None,
+            )
+
+            response = completion.choices[0].message.content or ""
+
+        except Exception as e:
+            self.logger.error(f"Error generating topic and caption: {str(e)}")
+            return self.DEFAULT_TOPIC, self.DEFAULT_CAPTION
+
+        topic, meme_caption = self._parse_topic_and_caption(response)
+        if topic:
+            self._cache_topic(chat_context, topic)
+        else:
+            topic = self.DEFAULT_TOPIC  # not cached, so the next call asks again
+        if meme_caption is None:
+            meme_caption = await asyncio.to_thread(self.generate_meme_caption, topic)
+        return topic, meme_caption
+
+    @_retry_transient
+    def _create_completion(self, **kwargs):
+        """
+        Groq chat completion, retried with jittered backoff on transient errors.
+        """
+        return self.client.chat.completions.create(**kwargs)
+
+    @_retry_transient
+    async def _acreate_completion(self, async_client: AsyncGroq, **kwargs):
+        """
+        AsyncGroq chat completion, retried with jittered backoff on transient errors.
+        """
+        return await async_client.chat.completions.create(**kwargs)
+
+    def _new_async_client(self) -> AsyncGroq:
+        """
+        Fresh AsyncGroq client for one generate_meme_from_chat / generate_memes_from_chats call,
+        so its connections never outlive the event loop that runs them.
+        """
+        return AsyncGroq(api_key=self._api_key, max_retries=0)
+
+    def _topic_and_caption_messages(self, chat_context: str) -> list:
+        """
+        Builds the prompt shared by the sync and async fused topic + caption calls.
+        """
+        return [
+            self._TOPIC_AND_CAPTION_SYSTEM,
+            {
+                "role": "user",
+                "content": chat_context
+            }
+        ]
+
+    def _parse_topic_and_caption(self, response: str) -> tuple:
+        """
+        Pulls the TOPIC: and CAPTION: labels out of a fused completion, wherever they appear.
+        The caption is None if the model didn't return one, so the caller can fall back to a
+        separate caption call; the topic is empty unless the model returned a single word.
+        """
+        topic_match = _TOPIC_LABEL.search(response)
+        topic = topic_match.group(1).strip(" *'\"`.").lower() if topic_match else ""
+        if len(topic.split()) != 1:
+            topic = ""
+
+        caption_match = _CAPTION_LABEL.search(response)
+        meme_caption = caption_match.group(1).strip(" *").replace('"', '') if caption_match else ""
+        return topic, meme_caption or None
+
+    def generate_memes_batch(self, chats: list) -> list:
+        """
+        Gets (topic, caption) pairs for many chats, packing up to BATCH_SIZE chats into each LLM call.
+        Chats with a keyword or cached topic skip the batch; chats whose line is missing or malformed
+        in the response fall back to generate_topic_and_caption.
+        """
+        results = [None] * len(chats)
+        misses = []
+        for i, chat in enumerate(chats):
+            topic = _keyword_topic(chat) or self._get_cached_topic(chat)
+            if topic:
+                results[i] = (topic, self.generate_meme_caption(topic))
+            else:
+                misses.append(i)
+
+        for start in range(0, len(misses), self.BATCH_SIZE):
+            chunk = misses[start:start + self.BATCH_SIZE]
+            for i, pair in zip(chunk, self._generate_memes_chunk([chats[i] for i in chunk])):
+                results[i] = pair
+        return results
+
+    def _generate_memes_chunk(self, chats: list) -> list:
+        """
+        One batched call for at most BATCH_SIZE chats. If the call itself fails, every chat gets the
+        defaults instead of a per-chat retry storm against an API that is already failing.
+        """
+        messages = [
+            self._BATCH_SYSTEM,
+            {
+                "role": "user",
+                "content": "".join(f"{i + 1}) {chat}\n---\n" for i, chat in enumerate(chats))
+            }
+        ]
+
+        parsed = {}
+        try:
+            completion = self._create_completion(
+                model="llama3-70b-8192",
+                messages=messages,
+                temperature=0.9,
+                max_completion_tokens=30 * len(chats),
+                top_p=1,
+                stream=False,
+                stop=None,
+            )
+
+            for line in (completion.choices[0].message.content or "").split("\n"):
+                match = re.match(r"\s*(\d+)\)\s*(.+?)\s*\|\s*(.+)", line)
+                if match:
+                    parsed[int(match.group(1))] = (match.group(2).strip().lower(), match.group(3).strip().replace('"', ''))
+
+        except Exception as e:
+            self.logger.error(f"Error generating meme batch: {str(e)}")
+            return [(self.DEFAULT_TOPIC, self.DEFAULT_CAPTION)] * len(chats)
+
+        results = []
+        for i, chat in enumerate(chats):
+            if i + 1 in parsed:
+                topic, meme_caption = parsed[i + 1]
+                self._cache_topic(chat, topic)
+            else:
+                topic, meme_caption = self.generate_topic_and_caption(chat)
+            results.append((topic, meme_caption))
+        return results
+
+    def _cache_key(self, chat_context: str) -> str:
+        """
+        Hashes the chat with case and whitespace normalized, so trivially different copies of
+        the same conversation share a cache entry.
+        """
+        normalized = " ".join(chat_context.lower().split())
+        return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+    def _get_cached_topic(self, chat_context: str):
+        """
+        Returns the cached topic for this chat context, or None.
+        """
+        key = self._cache_key(chat_context)
+        with self._cache_lock:
+            topic = self._topic_cache.get(key)
+            if topic is not None:
+                self._topic_cache.move_to_end(key)
+        return topic
+
+    def _cache_topic(self, chat_context: str, topic: str):
+        """
+        Stores a topic, evicting the least recently used entry once TOPIC_CACHE_SIZE is reached.
+        """
+        key = self._cache_key(chat_context)
+        with self._cache_lock:
+            self._topic_cache[key] = topic
+            self._topic_cache.move_to_end(key)
+            if len(self._topic_cache) > self.TOPIC_CACHE_SIZE:
+                self._topic_cache.popitem(last=False)
+
+    def _cache_captions(self, topic: str, captions: list):
+        """
+        Adds a topic's unused captions to its pool, evicting the least recently used pool once
+        TOPIC_CACHE_SIZE is reached. Concurrent misses on the same topic extend the pool rather
+        than overwrite each other's captions.
+        """
+        with self._cache_lock:
+            pool = self._caption_cache.get(topic)
+            if pool is None:
+                self._caption_cache[topic] = deque(captions)
+            else:
+                pool.extend(captions)
+            self._caption_cache.move_to_end(topic)
+            if len(self._caption_cache) > self.TOPIC_CACHE_SIZE:
+                self._caption_cache.popitem(last=False)
+
+    def clear_cache(self):
+        """
+        Drops all cached topics and caption pools.
+        """
+        with self._cache_lock:
+            self._topic_cache.clear()
+            self._caption_cache.clear()
+
+    async def generate_meme_from_chat(self, chat_context: str, **render_kwargs):
+        """
+        Processes chat history and generates a meme based on it.
+        The meme fetch and the LLM call run concurrently; only render waits on both.
+        Returns whatever render returns (meme URL or saved path), or None on failure.
+        """
+        async with self._new_async_client() as async_client:
+            return await self._agenerate_meme(async_client, chat_context, **render_kwargs)
+
+    async def _agenerate_meme(self, async_client: AsyncGroq, chat_context: str, **render_kwargs):
+        """
+        One fetch + topic/caption + render pipeline over the given AsyncGroq client.
+        """
+        tasks = [
+            asyncio.ensure_future(self.afetch_meme()),
+            asyncio.ensure_future(self._atopic_and_caption(async_client, chat_context)),
+        ]
+        try:
+            (meme, meme_name), (topic, meme_text) = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()  # don't leave the other half running (gather doesn't cancel it)
+            raise
+
+        if not meme:
+            print("❌ Error fetching meme.")
+            return None
+
+        print(f"🖼 Meme Topic: {topic}")
+        print(f"📝 Generated Meme Text: {meme_text}")
+        print(f"🔗 Using Meme: {meme_name}")
+
+        return await self.arender(meme, meme_text, **render_kwargs)
+
+    async def generate_memes_from_chats(self, chats: list, concurrency: int = 8) -> list:
+        """
+        Generates one meme per chat, running up to `concurrency` pipelines at once.
+        Returns the results in input order (None for failures).
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async with self._new_async_client() as async_client:
+            async def run(i: int, chat_context: str):
+                async with semaphore:
+                    try:
+                        return await self._agenerate_meme(async_client, chat_context, **self._batch_render_kwargs(i))
+                    except Exception as e:
+                        self.logger.error(f"Error generating meme: {str(e)}")
+                        return None
+
+            return await asyncio.gather(*(run(i, chat_context) for i, chat_context in enumerate(chats)))
+
+    def _batch_render_kwargs(self, index: int) -> dict:
+        """
+        Extra render() arguments for the index-th meme of generate_memes_from_chats.
+        """
+        return {}
+
+    def close(self):
+        """
+        Releases per-instance resources; subclasses that start threads or pools override this.
+        The sync Groq client and HTTP session are process-wide and stay open.
+        """
+        pass
@@ -1,115 +1,138 @@
-import os
-import logging
+import asyncio
+import ijson
+import orjson
 import requests
 import random
-from PIL import Image, ImageDraw, ImageFont
-from io import BytesIO
-from groq import Groq
+import tenacity
+import time
 import sys
+from base import MemeGeneratorBase, _reservoir_sample
 
-class MemeGenerator:
+
+def _is_rate_limited(exc: BaseException) -> bool:
+    """
+    True for HTTP 429s from Imgflip.
+    """
+    return isinstance(exc, requests.HTTPError) and exc.response is not None and exc.response.status_code == 429
+
+
+# exponential backoff for rate-limited Imgflip calls
+_retry_on_rate_limit = tenacity.retry(
+    retry=tenacity.retry_if_exception(_is_rate_limited),
+    wait=tenacity.wait_exponential(multiplier=0.5, max=8),
+    stop=tenacity.stop_after_attempt(5),
+    reraise=True,
+)
+
+
+class ImgflipMemeGenerator(MemeGeneratorBase):
     """
     A class to generate memes based on chat context using LLaMA 3-70B API via Groq and Imgflip API.
     """
 
+    TEMPLATES_TTL = 3600  # seconds to reuse the Imgflip template list (0 disables caching)
+    DEFAULT_CAPTION = "Me debugging at 3 AM..."
+
+    # get_memes response shared by every Imgflip generator in the process
+    _templates_cache = None
+    _templates_expiry = 0.0  # time.monotonic() deadline for _templates_cache
+
     def __init__(self, api_key: str, imgflip_username: str, imgflip_password: str):
         """
         Initialize the MemeGenerator with Groq API credentials and Imgflip credentials.
         """
-        os.environ["GROQ_API_KEY"] = api_key
-        self.client = Groq()
-        self.logger = logging.getLogger(__name__)
-        logging.basicConfig(level=logging.INFO)
-        
+        super().__init__(api_key)
+
         self.imgflip_username = imgflip_username
         self.imgflip_password = imgflip_password
 
-    def extract_topic_from_chat(self, chat_context: str) -> str:
+    def fetch_meme(self) -> tuple:
         """
-        Uses LLaMA 3-70B to analyze chat and determine the meme topic.
+        Picks a random Imgflip template. Returns (template_id, "name (url)"), or (None, None) on failure.
         """
-        messages = [
-            {
-                "role": "system",
-                "content": "Analyze the given conversation and return only a single-word topic "
-                           "(e.g., 'coding', 'gym', 'AI', 'exams', 'sleep', etc.) that best represents the discussion."
-            },
-            {
-                "role": "user",
-                "content": chat_context
-            }
-        ]
+        try:
+            meme_id, meme_image_url, meme_name = self.fetch_meme_template()
+        except requests.HTTPError:
+            meme_id = None  # still rate-limited after backing off
+        if not meme_id:
+            return None, None
+        return meme_id, f"{meme_name} ({meme_image_url})"
 
+    def render(self, meme, text: str):
+        """
+        Captions the template on Imgflip. Returns the generated meme URL, or None on failure.
+        Imgflip renders server-side, so it takes no render options (show, quality, ...).
+        """
         try:
-            completion = self.client.chat.completions.create(
-                model="llama3-70b-8192",
-                messages=messages,
-                temperature=0.7,
-                max_completion_tokens=5,
-                top_p=1,
-                stream=True,
-                stop=None,
-            )
-
-            topic = ""
-            for chunk in completion:
-                topic += chunk.choices[0].delta.content or ""
-
-            return topic.strip().lower()
-
-        except Exception as e:
-            self.logger.error(f"Error extracting topic: {str(e)}")
-            return "funny" #default
+            return self.create_meme(meme, text)
+        except requests.HTTPError:
+            print("❌ Error generating meme on Imgflip.")  # still rate-limited after backing off
+            return None
 
+    @_retry_on_rate_limit
     def fetch_meme_template(self):
         """
         Fetches the latest meme templates from Imgflip API.
+        The template list is reused for TEMPLATES_TTL seconds.
         """
-        response = requests.get("https://api.imgflip.com/get_memes")
-        
+        if time.monotonic() < self._templates_expiry:
+            selected_meme = random.choice(self._templates_cache)
+            return selected_meme["id"], selected_meme["url"], selected_meme["name"]
+
+        if self.TEMPLATES_TTL <= 0:
+            return self._stream_sample_template()
+
+        response = self.http.get("https://api.imgflip.com/get_memes")
+        if response.status_code == 429:
+            response.raise_for_status()  # let _retry_on_rate_limit back off
+
         if response.status_code == 200:
-            memes = response.json()["data"]["memes"]
+            memes = orjson.loads(response.content)["data"]["memes"]
+            self._store_templates(memes)
             selected_meme = random.choice(memes)  # Random meme template
             return selected_meme["id"], selected_meme["url"], selected_meme["name"]
         else:
             return None, None, None #fail
-        
-    def generate_meme_caption(self, topic: str, meme_name: str) -> str:
+
+    def _stream_sample_template(self):
         """
-        Uses LLaMA 3-70B to generate a contextual meme caption based on the topic and specific meme.
-        Ensures AI does not include explanations.
+        Uncached path: stream-parses get_memes and reservoir-samples one template,
+        never materializing the full list.
         """
-        messages = [
-            {
-                "role": "system",
-                "content": f"You are a meme expert. Generate ONLY a short, funny meme caption for the topic '{topic}'. "
-                           f"DO NOT add any explanations, introductions, or extra text. Just output the caption."
-            }
-        ]
+        with self.http.get("https://api.imgflip.com/get_memes", stream=True) as response:
+            if response.status_code == 429:
+                response.raise_for_status()  # let _retry_on_rate_limit back off
+            if response.status_code != 200:
+                return None, None, None #fail
 
-        try:
-            completion = self.client.chat.completions.create(
-                model="llama3-70b-8192",
-                messages=messages,
-                temperature=1.0,
-                max_completion_tokens=15,
-                top_p=1,
-                stream=True,
-                stop=None,
-            )
-
-            meme_caption = ""
-            for chunk in completion:
-                meme_caption += chunk.choices[0].delta.content or ""
-            return meme_caption.strip().replace('"', '')
-
-        except Exception as e:
-            self.logger.error(f"Error generating meme caption: {str(e)}")
-            return "Me debugging at 3 AM..."  #default caption
+            response.raw.decode_content = True
+            selected_meme = _reservoir_sample(ijson.items(response.raw, "data.memes.item"))
+
+        if selected_meme is None:
+            return None, None, None #fail
+        return selected_meme["id"], selected_meme["url"], selected_meme["name"]
 
+    def _store_templates(self, memes: list):
+        """
+        Caches the Imgflip template list for TEMPLATES_TTL seconds, for all instances.
+        """
+        if memes:
+            ImgflipMemeGenerator._templates_cache = memes
+            ImgflipMemeGenerator._templates_expiry = time.monotonic() + self.TEMPLATES_TTL
+
+    def clear_cache(self):
+        """
+        Drops all cached topics, caption pools and meme templates.
+        """
+        super().clear_cache()
+        ImgflipMemeGenerator._templates_cache = None
+        ImgflipMemeGenerator._templates_expiry = 0.0
+
+    @_retry_on_rate_limit
     def create_meme(self, meme_id: str, text: str):
         """
         Uses Imgflip API to overlay text on a meme template.
+        Returns the generated meme URL, or None on failure.
         """
         params = {
             "template_id": meme_id,
@@ -119,47 +142,36 @@ class MemeGenerator:
             "text1": "" #empty text (testing)
         }
 
-        response = requests.post("https://api.imgflip.com/caption_image", data=params)
-        
-        if response.status_code == 200 and response.json()["success"]:
-            meme_url = response.json()["data"]["url"]
+        response = self.http.post("https://api.imgflip.com/caption_image", data=params)
+        if response.status_code == 429:
+            response.raise_for_status()  # let _retry_on_rate_limit back off
+
+        result = orjson.loads(response.content) if response.status_code == 200 else {}
+        if result.get("success"):
+            meme_url = result["data"]["url"]
             print(f"\n✅ Meme Generated: {meme_url}")
+            return meme_url
         else:
             print("❌ Error generating meme on Imgflip.")
+            return None
 
-    def generate_meme_from_chat(self, chat_context: str):
-        """
-        Processes chat history and generates a meme based on it.
-        """
-        topic = self.extract_topic_from_chat(chat_context)
-        meme_id, meme_image_url, meme_name = self.fetch_meme_template()
-        
-        if not meme_id:
-            print("❌ Error fetching meme template.")
-            return
-
-        meme_text = self.generate_meme_caption(topic, meme_name)
-
-        print(f"🖼 Meme Topic: {topic}")
-        print(f"📝 Generated Meme Text: {meme_text}")
-        print(f"🔗 Using Meme Template: {meme_name} ({meme_image_url})")
 
-        self.create_meme(meme_id, meme_text)
+MemeGenerator = ImgflipMemeGenerator  # back-compat name
 
 
 def main():
     sys.stdout.reconfigure(encoding="utf-8")
     """
-    Example usage of the MemeGenerator class.
+    Example usage of the ImgflipMemeGenerator class.
     """
     api_key = "YOUR_YOUR_OWN_GODDAMN_API"
     imgflip_username = "I_AM_GUESSING_YOU'D_HAVE_YOUR_OWN_USERNAME"
-    imgflip_password = "YOU_SERIOUSLY_DONT_REMEMBER_YOUR_PASSWORD?" 
+    imgflip_password = "YOU_SERIOUSLY_DONT_REMEMBER_YOUR_PASSWORD?"
 
-    meme_generator = MemeGenerator(api_key, imgflip_username, imgflip_password)
+    meme_generator = ImgflipMemeGenerator(api_key, imgflip_username, imgflip_password)
 
     chat_history = "I think my Girlfriend cheated on me bro"
-    meme_generator.generate_meme_from_chat(chat_history)
+    asyncio.run(meme_generator.generate_meme_from_chat(chat_history))
 
 
 if __name__ == "__main__":
@@ -1,25 +1,113 @@
 import os
+import asyncio
 import logging
-import requests
+import functools
 import random
-from PIL import Image, ImageDraw, ImageFont
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
+from pathlib import Path
+from PIL import Image, ImageDraw, ImageFont
 import praw
-from groq import Groq
+from base import MemeGeneratorBase, _reservoir_sample
+
 
-class MemeGenerator:
+MAX_IMAGE_EDGE = 1024  # memes are downscaled to fit this box before drawing
+
+
+@functools.lru_cache(maxsize=32)
+def _load_font(font_path: str, size: int):
+    """
+    Loads (once per process) the caption font, falling back to PIL's default if it is missing.
+    """
+    try:
+        return ImageFont.truetype(font_path, size=size)
+    except OSError:
+        logging.getLogger(__name__).warning(f"{font_path} not found, falling back to PIL's default font")
+        return ImageFont.load_default()
+
+
+def _draw_caption(img, text: str, font_path: str):
+    """
+    Shrinks the image to at most MAX_IMAGE_EDGE px, then draws the outlined caption near the
+    bottom with a font scaled to the image width. Returns the (RGB) image.
+    """
+    if img.mode != "RGB":
+        img = img.convert("RGB")  # JPEG has no alpha/palette
+    img.thumbnail((MAX_IMAGE_EDGE, MAX_IMAGE_EDGE), Image.LANCZOS)
+
+    draw = ImageDraw.Draw(img)
+
+    #text placement
+    width, height = img.size
+    size = max(24, width // 25)
+    font = _load_font(font_path, size)
+    bbox = draw.textbbox((0, 0), text, font=font, stroke_width=2)
+    text_width, text_height = bbox[2] - bbox[0], bbox[3] - bbox[1]
+
+
+    x = (width - text_width) // 2
+    y = height - text_height - size  #caption position
+
+    #outline drawn in the same pass as the fill
+    draw.text((x, y), text, font=font, fill="white", stroke_width=2, stroke_fill="black")
+    return img
+
+
+def _render_meme(image_bytes: bytes, text: str, font_path: str, quality: int = 85) -> bytes:
+    """
+    Pure (picklable) render step for the process pool: decodes the image, draws the caption
+    and returns the encoded JPEG.
+    """
+    img = Image.open(BytesIO(image_bytes))
+    img.draft("RGB", (MAX_IMAGE_EDGE, MAX_IMAGE_EDGE))  # JPEG: decode at reduced scale
+    img = _draw_caption(img, text, font_path)
+
+    output = BytesIO()
+    img.save(output, "JPEG", quality=quality, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+def _show_image(path: str):
+    """
+    Opens a saved meme in the system image viewer.
+    """
+    with Image.open(path) as img:
+        img.show()
+
+
+@functools.lru_cache(maxsize=None)
+def _image_pool() -> ProcessPoolExecutor:
+    """
+    Process pool for CPU-bound decode/draw/encode, shared by every Reddit generator in the process.
+    """
+    return ProcessPoolExecutor(max_workers=os.cpu_count())
+
+
+def shutdown_image_pool():
+    """
+    Shuts down the shared render pool, if it was ever started. A later render starts a new one.
+    """
+    if _image_pool.cache_info().currsize:
+        _image_pool().shutdown()
+        _image_pool.cache_clear()
+
+
+class RedditMemeGenerator(MemeGeneratorBase):
     """
     A class to generate memes based on chat context using LLaMA 3-70B API via Groq and memes from Reddit.
     """
 
+    MEME_BUFFER_LOW = 10  # refill the Reddit meme buffer below this many entries
+    MEME_FIRST_FILL_TIMEOUT = 5.0  # seconds a cold-start fetch waits for the first background fill
+    RECENT_MEMES = 200  # recently served URLs kept out of refills
+
     def __init__(self, api_key: str, reddit_client_id: str, reddit_client_secret: str, reddit_user_agent: str):
         """
         Initialize the MemeGenerator with Groq API and Reddit API credentials.
         """
-        os.environ["GROQ_API_KEY"] = api_key
-        self.client = Groq()
-        self.logger = logging.getLogger(__name__)
-        logging.basicConfig(level=logging.INFO)
+        super().__init__(api_key)
 
         # Reddit API client
         self.reddit = praw.Reddit(
@@ -27,158 +115,212 @@ class MemeGenerator:
             client_secret=reddit_client_secret,
             user_agent=reddit_user_agent
         )
+        self._image_headers = {"User-Agent": reddit_user_agent}  # per request; the session is shared
+
+        # caption font; _load_font caches each size after first use
+        self.font_path = "arial.ttf"
+
+        # hot memes prefetched off the critical path by a background thread
+        self._meme_buffer = deque()
+        self._meme_buffer_lock = threading.Lock()
+        self._refill_needed = threading.Event()
+        self._refill_needed.set()
+        self._first_fill = threading.Event()  # set once the first refill attempt finishes
+        self._recently_served = deque(maxlen=self.RECENT_MEMES)
+        self._reddit_lock = threading.Lock()  # praw is not thread-safe
+        self._closed = threading.Event()
+        self._refill_thread = threading.Thread(target=self._refill_meme_buffer, daemon=True)
+        self._refill_thread.start()
+
+    def fetch_meme(self) -> tuple:
+        """
+        Picks a random r/memes image. Returns (image_url, image_url).
+        """
+        meme_url = self.fetch_meme_from_reddit()
+        return meme_url, meme_url
 
-    def extract_topic_from_chat(self, chat_context: str) -> str:
+    def render(self, meme, text: str, **kwargs):
         """
-        Uses LLaMA 3-70B to analyze chat and determine the meme topic.
+        Draws the caption on the Reddit image. Returns the saved path, or None on failure.
         """
-        messages = [
-            {
-                "role": "system",
-                "content": "Analyze the given conversation and return only a single-word topic (e.g., 'coding', 'gym', 'AI', 'exams', 'sleep', etc.) that best represents the discussion."
-            },
-            {
-                "role": "user",
-                "content": chat_context
-            }
-        ]
+        return self.overlay_text_on_image(meme, text, **kwargs)
 
+    async def arender(self, meme, text: str, show: bool = False,
+                      output_path: str = "generated_meme.jpg", quality: int = 85):
+        """
+        Async render: downloads in a thread and draws/encodes in the shared process pool,
+        keeping the CPU-bound work off the event loop and the GIL. Takes the same options
+        as overlay_text_on_image.
+        """
         try:
-            completion = self.client.chat.completions.create(
-                model="llama3-70b-8192",
-                messages=messages,
-                temperature=0.7,
-                max_completion_tokens=5,
-                top_p=1,
-                stream=True,
-                stop=None,
-            )
-
-            topic = ""
-            for chunk in completion:
-                topic += chunk.choices[0].delta.content or ""
-
-            return topic.strip().lower()
+            image_bytes = await asyncio.to_thread(self._download_image, meme)
+            if image_bytes is None:
+                print("Error fetching meme image.")
+                return None
+
+            loop = asyncio.get_running_loop()
+            jpeg = await loop.run_in_executor(_image_pool(), _render_meme, image_bytes, text, self.font_path, quality)
+            await asyncio.to_thread(Path(output_path).write_bytes, jpeg)
+            if show:
+                await asyncio.to_thread(_show_image, output_path)
 
         except Exception as e:
-            self.logger.error(f"Error extracting topic: {str(e)}")
-            return "funny"  # Default topic 
+            self.logger.error(f"Error overlaying text on image: {str(e)}")
+            return None
+
+        print("\nMeme generated successfully!")
+        return output_path
 
-    def generate_meme_caption(self, topic: str) -> str:
+    def _batch_render_kwargs(self, index: int) -> dict:
         """
-        Uses LLaMA 3-70B to generate a witty meme caption.
+        Batch memes are saved as generated_meme_<i>.jpg so they don't overwrite each other.
         """
-        messages = [
-            {
-                "role": "system",
-                "content": f"Generate a funny meme caption about {topic}. Keep it short and witty, under 10 words."
-            }
-        ]
-
-        try:
-            completion = self.client.chat.completions.create(
-                model="llama3-70b-8192",
-                messages=messages,
-                temperature=1.0,
-                max_completion_tokens=20,
-                top_p=1,
-                stream=True,
-                stop=None,
-            )
-
-            meme_caption = ""
-            for chunk in completion:
-                meme_caption += chunk.choices[0].delta.content or ""
-
-            return meme_caption.strip()
-
-        except Exception as e:
-            self.logger.error(f"Error generating meme caption: {str(e)}")
-            return "When life gives you errors, debug them!"  # Default caption 
+        return {"output_path": f"generated_meme_{index}.jpg"}
 
     def fetch_meme_from_reddit(self) -> str:
         """
         Fetches a random meme image URL from r/memes subreddit.
+        Pops from the prefetched buffer. On a cold start it waits for the first background fill
+        instead of repeating the same query; Reddit is only hit inline if the buffer is still empty.
         """
-        try:
-            subreddit = self.reddit.subreddit("memes")
-            memes = [post for post in subreddit.hot(limit=50) if not post.stickied and post.url.endswith(("jpg", "png"))]
+        meme_url = self._pop_buffered_meme()
+        if meme_url is None and not self._first_fill.is_set():
+            self._first_fill.wait(timeout=self.MEME_FIRST_FILL_TIMEOUT)
+            meme_url = self._pop_buffered_meme()
+        if meme_url:
+            return meme_url
 
-            if memes:
-                meme_post = random.choice(memes)
-                return meme_post.url
-            else:
-                return None
+        try:
+            with self._reddit_lock:
+                meme_url = _reservoir_sample(self._iter_hot_memes())
         except Exception as e:
             self.logger.error(f"Error fetching meme from Reddit: {str(e)}")
             return None
 
-    def overlay_text_on_image(self, image_url: str, text: str):
+        if meme_url:
+            with self._meme_buffer_lock:
+                self._recently_served.append(meme_url)
+        return meme_url
+
+    def _pop_buffered_meme(self):
         """
-        Downloads a meme image and overlays AI-generated text on it.
+        Pops the next prefetched meme URL (or None), asking for a refill when the buffer runs low.
         """
-        try:
-            response = requests.get(image_url)
-            if response.status_code != 200:
-                print("Error fetching meme image.")
-                return
+        with self._meme_buffer_lock:
+            meme_url = self._meme_buffer.popleft() if self._meme_buffer else None
+            if meme_url:
+                self._recently_served.append(meme_url)
+            remaining = len(self._meme_buffer)
 
-            img = Image.open(BytesIO(response.content))
-            draw = ImageDraw.Draw(img)
+        if remaining < self.MEME_BUFFER_LOW:
+            self._refill_needed.set()
+        return meme_url
 
-            # default font
-            font = ImageFont.truetype("arial.ttf", size=40)
+    def _iter_hot_memes(self):
+        """
+        Lazily yields the image URLs of the current non-stickied hot posts on r/memes.
+        Callers must hold _reddit_lock while iterating.
+        """
+        subreddit = self.reddit.subreddit("memes")
+        for post in subreddit.hot(limit=50):
+            if not post.stickied and post.url.endswith(("jpg", "png")):
+                yield post.url
 
-            #text placement
-            width, height = img.size
-            bbox = draw.textbbox((0, 0), text, font=font)
-            text_width, text_height = bbox[2] - bbox[0], bbox[3] - bbox[1]
+    def _refill_meme_buffer(self):
+        """
+        Background loop: waits until the buffer runs low, then tops it up with shuffled hot memes.
+        Exits once close() is called.
+        """
+        while True:
+            self._refill_needed.wait()
+            self._refill_needed.clear()  # clear before checking _closed so close()'s wake-up can't be lost
+            if self._closed.is_set():
+                return
 
+            try:
+                with self._reddit_lock:
+                    memes = list(self._iter_hot_memes())
+            except Exception as e:
+                self.logger.error(f"Error refilling meme buffer from Reddit: {str(e)}")
+            else:
+                if self._closed.is_set():
+                    return  # closed while we were talking to Reddit
+                random.shuffle(memes)
+                with self._meme_buffer_lock:
+                    skip = set(self._meme_buffer) | set(self._recently_served)
+                    self._meme_buffer.extend(url for url in memes if url not in skip)
+            finally:
+                self._first_fill.set()
+
+    def overlay_text_on_image(self, image_url: str, text: str, show: bool = False,
+                              output_path: str = "generated_meme.jpg", quality: int = 85):
+        """
+        Downloads a meme image and overlays AI-generated text on it.
+        Saves a JPEG to output_path; only opens an image viewer when show=True.
+        Returns output_path on success, None otherwise.
+        """
+        try:
+            image_bytes = self._download_image(image_url)
+            if image_bytes is None:
+                print("Error fetching meme image.")
+                return
 
-            x = (width - text_width) // 2
-            y = height - 100  #caption position
+            img = Image.open(BytesIO(image_bytes))
+            img.draft("RGB", (MAX_IMAGE_EDGE, MAX_IMAGE_EDGE))  # JPEG: decode at reduced scale
+            img.load()
 
-            #outline
-            draw.text((x - 2, y - 2), text, font=font, fill="black")
-            draw.text((x + 2, y + 2), text, font=font, fill="black")
-            draw.text((x, y), text, font=font, fill="white")
+            img = _draw_caption(img, text, self.font_path)
 
             # Save
-            img.save("generated_meme.jpg")
-            img.show()
+            img.save(output_path, "JPEG", quality=quality, optimize=True, progressive=True)
+            if show:
+                img.show()
             print("\nMeme generated successfully!")
+            return output_path
 
         except Exception as e:
             self.logger.error(f"Error overlaying text on image: {str(e)}")
+            return None
 
-    def generate_meme_from_chat(self, chat_context: str):
+    def _download_image(self, image_url: str):
         """
-        Processes chat history and generates a meme based on it.
+        Downloads a meme image over the shared session. Returns the raw bytes, or None on failure.
         """
-        topic = self.extract_topic_from_chat(chat_context)
-        meme_text = self.generate_meme_caption(topic)
-        meme_url = self.fetch_meme_from_reddit()
+        response = self.http.get(image_url, headers=self._image_headers)
+        if response.status_code != 200:
+            return None
+        return response.content
 
-        if meme_url:
-            print(f"Reddit Meme URL: {meme_url}")
-            self.overlay_text_on_image(meme_url, meme_text)
-        else:
-            print("Failed to fetch meme from Reddit.")
+    def close(self):
+        """
+        Stops the background refill thread. The shared render pool is shut down separately
+        with shutdown_image_pool(), since other instances may still be using it.
+        """
+        self._closed.set()
+        self._refill_needed.set()  # wake the thread so it sees _closed
+        self._refill_thread.join(timeout=5)
+
+
+MemeGenerator = RedditMemeGenerator  # back-compat name
 
 
 def main():
     """
-    Example usage of the MemeGenerator class.
+    Example usage of the RedditMemeGenerator class.
     """
     api_key = "YOU_YOUR_OWN_GODDAMN_API"
     reddit_client_id = "YOU_YOUR_OWN_GODDAMN_CLIENT_ID"
     reddit_client_secret = "YOU_YOUR_OWN_GODDAMN_SECRET_ID"
     reddit_user_agent = "YOU_YOUR_OWN_GODDAMN_USER_AGENT"
 
-    meme_generator = MemeGenerator(api_key, reddit_client_id, reddit_client_secret, reddit_user_agent)
+    meme_generator = RedditMemeGenerator(api_key, reddit_client_id, reddit_client_secret, reddit_user_agent)
 
     chat_history = "Bro, I pulled an all-nighter debugging and found out the issue was a missing semicolon!"
-    meme_generator.generate_meme_from_chat(chat_history)
+    try:
+        asyncio.run(meme_generator.generate_meme_from_chat(chat_history))
+    finally:
+        meme_generator.close()
+        shutdown_image_pool()
 
 
 if __name__ == "__main__":